@@ -19,13 +19,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from names import *
-from util import create_dir_if_not_exists
-from average import *
-from series import *
-from delay import combine_delays, plot_delay_cdf
-from buffer_occupancy import average_buffer_occupancy, plot_buffer_occupancy
-from delivery_matrix import generate_delivery_matrix_reports, average_delivery_matrix, plot_all_delivery_matrix
-from encounters import generate_unique_encounters_reports, average_unique_encounters, average_encounters, plot_unique_encounters, plot_encounters
-from node_density import average_node_density, plot_all_node_density
-from one import main
+import os
+
+import matplotlib
+
+# plots are only written to files, so skip the initialization of an interactive backend
+if 'MPLBACKEND' not in os.environ:
+    matplotlib.use('Agg')
+
+from .names import *
+from .util import create_dir_if_not_exists
+from .average import *
+from .series import *
+from .delay import combine_delays, plot_delay_cdf
+from .buffer_occupancy import average_buffer_occupancy, plot_buffer_occupancy
+from .delivery_matrix import generate_delivery_matrix_reports, average_delivery_matrix, plot_all_delivery_matrix
+from .encounters import generate_unique_encounters_reports, average_unique_encounters, average_encounters, plot_unique_encounters, plot_encounters
+from .node_density import average_node_density, plot_all_node_density
+from .one import main
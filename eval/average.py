@@ -1,19 +1,37 @@
-from names import *
+import io
+import warnings
 
+import numpy as np
 
-def average_configs(config, report, outfile_prefix=None):
+from .names import *
+from .util import flush_staged, parallel_starmap
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def average_config_files(config, report, outfile_prefix=None):
     if outfile_prefix is None:
         outfile_prefix = config
     report_files = report_files_from_config(config, report)
     average_file = report_file_from_tuple(base_config(outfile_prefix), report)
-    average_vals(report_files, average_file)
+    return report_files, average_file
+
+
+def average_configs(config, report, outfile_prefix=None):
+    average_vals(*average_config_files(config, report, outfile_prefix))
 
 
-# def average_vals(infiles, outfile, maxcols=None):
-#     import numpy as np
-#     inputs = [np.genfromtxt(infile, delimiter=' ', skip_header=0) for infile in infiles]
-#     average = np.mean(np.array(inputs), axis=0)
-#     np.savetxt(outfile, average, delimiter=' ')
+def average_all_configs(configs, report):
+    """
+    Averages the reports of several independent configurations in parallel
+
+    :param configs: list of configurations, each averaged into its own base configuration
+    :param report: report name
+    """
+    parallel_starmap(average_vals, [average_config_files(c, report) for c in configs])
 
 
 def try_divide(n, d):
@@ -23,47 +41,135 @@ def try_divide(n, d):
         return n
 
 
+def is_float(field):
+    try:
+        float(field)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def first_field(reports, col):
+    for report in reports:
+        if len(report) > 0 and report.shape[1] > col:
+            return report[0, col]
+    return None
+
+
 def average_vals(infiles, outfile, maxcols=None):
     """
     Calculates average over timeseries values
 
+    Non-float columns (e.g., host groups) are copied from the last file containing the respective row.
+    Files whose rows have a varying number of columns are averaged line by line.
+
     :param infiles: intput files, averages are calculated starting from the second column
     :param outfile: output file containing averages of all values
     :param maxcols: maximum number of columns to average over
     :return: None
     """
-    handles = [open(f, 'r') for f in infiles]
+    try:
+        with warnings.catch_warnings():
+            # empty reports are expected, e.g., if no message was delivered
+            warnings.filterwarnings('ignore', message='loadtxt: input contained no data', category=UserWarning)
+            reports = [np.loadtxt(f, dtype=str, comments=None, ndmin=2)[:, :maxcols] for f in infiles]
+        rows = max(len(r) for r in reports)
+        cols = max(r.shape[1] for r in reports)
+        float_cols = [i for i in range(cols) if is_float(first_field(reports, i))]
+        label_cols = [i for i in range(cols) if i not in float_cols]
+        # pad shorter reports with NaN, so that each row is only averaged over the files containing it
+        values = np.full((len(reports), rows, len(float_cols)), np.nan)
+        labels = np.full((rows, len(label_cols)), '', dtype=object)
+        for i, report in enumerate(reports):
+            values[i, :len(report)] = report[:, float_cols].astype(np.float64)
+            labels[:len(report)] = report[:, label_cols]
+    except (ValueError, IndexError):
+        _average_vals_streaming(infiles, outfile, maxcols)
+        return
+    averages = np.empty((rows, cols), dtype=object)
+    averages[:, float_cols] = np.nanmean(values, axis=0)
+    averages[:, label_cols] = labels
+    # repr writes the shortest round-trip representation of each float, like the line-by-line averaging
+    float_cols = set(float_cols)
+    buf = io.StringIO()
+    with open(outfile, 'w') as outfile:
+        for row in averages.tolist():
+            buf.write(' '.join(repr(v) if i in float_cols else v for (i, v) in enumerate(row)) + '\n')
+            flush_staged(buf, outfile)
+        flush_staged(buf, outfile, 0)
+
+
+if njit is not None:
+    @njit(cache=True)
+    def accum_row(accum, row):
+        for i in range(row.shape[0]):
+            accum[i] += row[i]
+else:
+    def accum_row(accum, row):
+        accum[:row.shape[0]] += row
+
+
+def parse_row(fields, label_cols=()):
+    """
+    Parses a row of fields into floats, non-float fields are parsed as zero
+
+    :param fields: list of fields
+    :param label_cols: columns known to contain non-float fields
+    :return: tuple of the parsed row and a dictionary of the non-float fields by column
+    """
+    labels = dict((i, fields[i]) for i in label_cols if i < len(fields))
+    values = list(fields)
+    for i in labels:
+        values[i] = '0'
+    try:
+        return np.array(values, dtype=np.float64), labels
+    except ValueError:
+        # unexpected non-float field outside of the known label columns
+        row = np.zeros(len(fields))
+        for i, field in enumerate(values):
+            try:
+                row[i] = float(field)
+            except ValueError:
+                labels[i] = field
+        return row, labels
+
+
+def _average_vals_streaming(infiles, outfile, maxcols=None):
+    handles = [open(f, 'r', buffering=1 << 20) for f in infiles]
     iterators = [iter(h) for h in handles]
     warncount = 1
+    label_cols = None
+    buf = io.StringIO()
     with open(outfile, 'w') as outfile:
         while True:
             accum = None
+            labels = {}
             active = len(iterators)
             for it in iterators:
                 try:
-                    fields = it.next().split()
-                    if maxcols is None:
-                        cols = len(fields)
-                    else:
-                        cols = min(len(fields), maxcols)
+                    fields = next(it).split()[:maxcols]
+                    if label_cols is None:
+                        # classify columns once based on the first row instead of trying to parse every field
+                        label_cols = [i for (i, field) in enumerate(fields) if not is_float(field)]
                     if accum is None:
-                        accum = [0 for _ in range(cols)]
-                    for i in range(cols):
-                        try:
-                            accum[i] += float(fields[i])
-                        except ValueError:
-                            if warncount > 0:
-                                print "Warning: field in column " + repr(i) + " is not a float"
-                                warncount -= warncount
-                            accum[i] = fields[i]
+                        accum = np.zeros(len(fields))
+                    row, row_labels = parse_row(fields[:len(accum)], label_cols)
+                    if row_labels and warncount > 0:
+                        print("Warning: field in column " + repr(min(row_labels)) + " is not a float")
+                        warncount -= 1
+                    labels.update(row_labels)
+                    accum_row(accum, row)
                 except StopIteration:
                     active -= 1
             if active == 0:
                 break
+            accum = accum.tolist()
+            for i, label in labels.items():
+                accum[i] = label
             avg = [try_divide(s, active) for s in accum]
-            for a in avg:
-                outfile.write(str(a) + ' ')
-            outfile.write('\n')
+            buf.write(''.join([str(a) + ' ' for a in avg]) + '\n')
+            flush_staged(buf, outfile)
+        flush_staged(buf, outfile, 0)
 
     for h in handles:
         h.close()
@@ -1,6 +1,6 @@
-from names import *
-from series import plot_xy
-from average import average_configs
+from .names import *
+from .series import plot_xy
+from .average import average_configs
 
 
 def average_buffer_occupancy(config):
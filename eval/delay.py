@@ -1,51 +1,37 @@
-from names import *
-from filter import filtered_split_reader
-from series import plot_xy
+import numpy as np
+
+from .names import *
+from .filter import read_report
+from .series import plot_xy
+from .util import parallel_starmap
 
 
 def generate_combined_delay_cdf_report(created_filenames, delivered_filenames, out_filename):
-    combined_created = 0
-    combined_delivered = []
-    for (created_filename, delivered_filename) in zip(created_filenames, delivered_filenames):
-        created, delivered = generate_delay(created_filename, delivered_filename)
-        combined_created += created
-        combined_delivered += delivered
+    results = parallel_starmap(generate_delay, zip(created_filenames, delivered_filenames))
+    combined_created = sum(created for (created, _) in results)
+    combined_delivered = np.concatenate([delivered for (_, delivered) in results])
     write_delay_cdf(combined_created, combined_delivered, out_filename)
 
 
-def generate_delay(created_filename, delivered_filename, prefixes=None):
-    if prefixes is None:
-        prefixes = [['M']]
-    with open(created_filename, 'r') as created_file, \
-            open(delivered_filename, 'r') as delivered_file:
-        created = {}
-        unique_deliveries = {}
-        for fields in filtered_split_reader(created_file, prefixes):
-            m_id = fields[1]
-            t_sent = float(fields[0])
-            created[m_id] = t_sent
-            unique_deliveries[m_id] = set()
-        delivered = []
-        for fields in filtered_split_reader(delivered_file, prefixes):
-            last_in_path = fields[-1].split('->')[-1]
-            m_id = fields[1]
-            if last_in_path in unique_deliveries[m_id]:
-                continue
-            unique_deliveries[m_id].add(last_in_path)
-            t_recv = float(fields[0])
-            t_sent = created[m_id]
-            delay = t_recv - t_sent
-            delivered.append(delay)
-        delivered.sort()
-        return len(created), delivered
+def generate_delay(created_filename, delivered_filename):
+    created = read_report(created_filename, usecols=[0, 1], names=['time', 'id'])
+    # index by message ID, so that creation times are looked up through pandas' hash table
+    created = created.drop_duplicates('id', keep='last').set_index('id').time
+    delivered = read_report(delivered_filename, usecols=[0, 1, 9], names=['time', 'id', 'path'])
+    # count each message only once per receiver, i.e., last host in path
+    delivered['last_in_path'] = delivered.path.str.rsplit('->', n=1).str[-1]
+    delivered = delivered.drop_duplicates(['id', 'last_in_path'])
+    delays = delivered.time.to_numpy(dtype=np.float64) - delivered.id.map(created).to_numpy(dtype=np.float64)
+    delays.sort()
+    return len(created), delays
 
 
 def write_delay_cdf(created, delivered, out_filename):
-    delivered.sort()
-    with open(out_filename, 'w') as outfile:
-        outfile.write(str(0) + ' ' + str(0) + '\n')
-        for (idx, val) in enumerate(delivered):
-            outfile.write(str(val) + ' ' + str(float(idx) / created) + '\n')
+    # sort a copy, leaving the caller's delays untouched; a stable sort (timsort) takes advantage of the already
+    # sorted runs of combined reports
+    delivered = np.sort(np.asarray(delivered, dtype=np.float64), kind='stable')
+    cdf = np.arange(len(delivered), dtype=np.float64) / created
+    np.savetxt(out_filename, np.column_stack([np.r_[0.0, delivered], np.r_[0.0, cdf]]), fmt='%.9g', delimiter=' ')
 
 
 def combine_delays(config):
@@ -1,89 +1,89 @@
-import collections
 import re
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
-from names import *
-from average import average_configs
-from filter import filtered_split_reader
+from .names import *
+from .average import average_configs
+from .filter import read_report
+from .util import parallel_starmap
+
+
+# assume host name in the form 'grp123' where 'grp' identifies the host group
+HOSTNAME_RE = re.compile(r"^([a-z]+)([0-9]+)", re.I)
 
 
 def group_from_hostname(hostname):
-    match = re.match(r"([a-z]+)([0-9]+)", hostname, re.I)
+    match = HOSTNAME_RE.match(hostname)
     if match:
-        return match.groups()[0]
+        return match.group(1)
     else:
         return None
 
 
-def generate_delivery_matrix(created_filename, delivered_filename, outfile_name, prefixes=[['M']]):
-    with open(created_filename, 'r') as created_file, \
-            open(delivered_filename, 'r') as delivered_file, \
-            open(outfile_name, 'w') as outfile:
-        created = collections.defaultdict(int)
-        for message in iter(filtered_split_reader(created_file, prefixes)):
-            source, destination = (message[3], message[4])
-            # assume host name in the form 'grp123' where 'grp' identifies the host group
-            pair = (group_from_hostname(source), group_from_hostname(destination))
-            created[pair] += 1
-
-        delivered = collections.defaultdict(int)
-        for message in iter(filtered_split_reader(delivered_file, prefixes)):
-            source, destination = (message[5], message[6])
-            # assume host name in the form 'grp123' where 'grp' identifies the host group
-            pair = (group_from_hostname(source), group_from_hostname(destination))
-            delivered[pair] += 1
-
-        pdr = {}
-        for pair, count in created.iteritems():
-            if pair in delivered:
-                pdr[pair] = float(delivered[pair]) / count
-            else:
-                pdr[pair] = 0.0
-
-        sorted_pdr = sorted(pdr.items())
-        for item in sorted_pdr:
-            outfile.write(str(item[0][0]) + ' ' + str(item[0][1]) + ' ' + str(item[1]) + '\n')
-
-
-def generate_delivery_matrix_report(tuple):
+def count_group_pairs(sources, destinations, n):
+    """
+    Counts messages per pair of host groups
+
+    :param sources: indices of the source host groups, negative if unknown
+    :param destinations: indices of the destination host groups, negative if unknown
+    :param n: number of host groups
+    :return: matrix with the message count of pair (source, destination) in row source and column destination
+    """
+    valid = (sources >= 0) & (destinations >= 0)
+    return np.bincount(sources[valid] * n + destinations[valid], minlength=n * n).reshape(n, n)
+
+
+def generate_delivery_matrix(created_filename, delivered_filename, outfile_name):
+    created = read_report(created_filename, usecols=[3, 4], names=['source', 'destination'])
+    delivered = read_report(delivered_filename, usecols=[5, 6], names=['source', 'destination'])
+    # extract the group of each distinct host name only once and look up the groups of all messages by host code
+    columns = [created.source, created.destination, delivered.source, delivered.destination]
+    codes, hostnames = pd.factorize(pd.concat(columns, ignore_index=True))
+    host_groups = [group_from_hostname(h) for h in hostnames]
+    groups = sorted(set(g for g in host_groups if g is not None))
+    group_index = dict((g, i) for i, g in enumerate(groups))
+    # trailing -1 for missing host names, which are factorized to code -1
+    host_group_index = np.array([group_index.get(g, -1) for g in host_groups] + [-1], dtype=np.int64)
+    created_src, created_dst, delivered_src, delivered_dst = \
+        np.split(host_group_index[codes], np.cumsum([len(c) for c in columns])[:-1])
+    created_count = count_group_pairs(created_src, created_dst, len(groups))
+    delivered_count = count_group_pairs(delivered_src, delivered_dst, len(groups))
+    pdr = np.divide(delivered_count, created_count, out=np.zeros(created_count.shape), where=created_count > 0)
+    with open(outfile_name, 'w') as outfile:
+        for (src, dst) in np.argwhere(created_count > 0):
+            outfile.write(groups[src] + ' ' + groups[dst] + ' ' + str(pdr[src, dst]) + '\n')
+
+
+def delivery_matrix_report_files(tuple):
     created_file = report_file_from_tuple(tuple, CREATED_REPORT)
     delivered_file = report_file_from_tuple(tuple, DELIVERED_REPORT)
     outfile = report_file_from_tuple(tuple, DELIVERY_MATRIX_REPORT)
-    generate_delivery_matrix(created_file, delivered_file, outfile)
+    return created_file, delivered_file, outfile
+
+
+def generate_delivery_matrix_report(tuple):
+    generate_delivery_matrix(*delivery_matrix_report_files(tuple))
 
 
 def generate_delivery_matrix_reports(config):
-    for tuple in expand_config(config):
-        generate_delivery_matrix_report(tuple)
+    parallel_starmap(generate_delivery_matrix, [delivery_matrix_report_files(t) for t in expand_config(config)])
 
 
 def average_delivery_matrix(config):
     average_configs(config, DELIVERY_MATRIX_REPORT)
 
 
-def type_to_integer_list(list):
-    u = np.unique(list)
-    d = dict([(u, i) for i, u in enumerate(u)])
-    return np.array([d[x] for x in list])
-
-
 def plot_delivery_matrix(report_file, plot_file, idx=None):
     import matplotlib.colors as colors
     cmap = 'magma'
     fig, ax = plt.subplots(nrows=1, ncols=1, figsize=(4, 4))
-    dat = np.genfromtxt(report_file, dtype=None, delimiter=' ', skip_header=0)
-    dat = zip(*dat)
-    x = dat[0]
-    y = dat[1]
-    z = dat[2]
-    xu = np.unique(x)
-    yu = np.unique(y)
-    xi = type_to_integer_list(x)
-    yi = type_to_integer_list(y)
+    dat = np.genfromtxt(report_file, dtype=[('src', 'U16'), ('dst', 'U16'), ('pdr', 'f8')], ndmin=1)
+    xi, xu = pd.factorize(dat['src'], sort=True)
+    yi, yu = pd.factorize(dat['dst'], sort=True)
     grid = np.zeros((len(xu), len(yu)))
-    grid[xi, yi] = z
+    grid[xi, yi] = dat['pdr']
 
     if idx is not None:
         # sort on axis 0
@@ -92,11 +92,13 @@ def plot_delivery_matrix(report_file, plot_file, idx=None):
         grid[:, range(len(idx))] = grid[:, idx]
         xu = xu[idx]
 
-    ax.pcolor(grid, norm=colors.Normalize(vmin=0, vmax=1), cmap=plt.get_cmap(cmap))
-    for x, row in enumerate(grid):
-        for y, val in enumerate(row):
-            color = 'black' if val > 0.5 else 'white'
-            ax.annotate('{:.2f}'.format(float(val)), (y + 0.5, x + 0.5), color=color, ha="center", va="center")
+    # a single image instead of one quad per cell, placed like pcolor, i.e., cell (x, y) spans [y, y + 1] x [x, x + 1]
+    ax.imshow(grid, norm=colors.Normalize(vmin=0, vmax=1), cmap=plt.get_cmap(cmap), interpolation='nearest',
+              origin='lower', extent=(0, grid.shape[1], 0, grid.shape[0]), aspect='auto')
+    text_colors = np.where(grid > 0.5, 'black', 'white')
+    rows, cols = np.indices(grid.shape)
+    for y, x, val, color in zip(cols.ravel() + 0.5, rows.ravel() + 0.5, grid.ravel(), text_colors.ravel()):
+        ax.text(y, x, '{:.2f}'.format(val), color=color, ha="center", va="center")
 
     titles = [pretty_title(t) for t in xu]
     indices = np.arange(len(titles)) + 0.5
@@ -119,5 +121,6 @@ def plot_delivery_matrix(report_file, plot_file, idx=None):
 def plot_all_delivery_matrix(config):
     report_files = report_files_from_config(config, DELIVERY_MATRIX_REPORT)
     plot_files = plot_files_from_config(config, DELIVERY_MATRIX_REPORT)
-    for (report_file, plot_file) in zip(report_files, plot_files):
-        plot_delivery_matrix(report_file, plot_file, idx=[3, 2, 4, 1, 6, 5, 0])
+    idx = [3, 2, 4, 1, 6, 5, 0]
+    parallel_starmap(plot_delivery_matrix, [(report_file, plot_file, idx)
+                                            for (report_file, plot_file) in zip(report_files, plot_files)])
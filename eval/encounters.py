@@ -1,36 +1,51 @@
-from names import *
-from series import plot_xy
-from average import average_configs
+import numpy as np
+
+from .names import *
+from .series import plot_xy
+from .average import average_configs
+from .util import parallel_starmap
 
 
 def read_unique_encounters(infile):
-    unique_encounters_count = {}
-    with open(infile, 'r') as file:
-        for line in file:
-            (node, encounters, unique_encounters) = line.split()
-            node = int(node)
-            unique_encounters = int(unique_encounters)
-            if not node in unique_encounters_count:
-                unique_encounters_count[node] = 0
-            unique_encounters_count[unique_encounters] = unique_encounters_count.setdefault(unique_encounters, 0) + 1
-    return unique_encounters_count
+    """
+    Counts the nodes per number of unique encounters
+
+    Every node ID is also included as a key (possibly with a count of zero), so that the rows of all runs line up
+    when averaging.
+
+    :param infile: encounters report with rows 'node encounters unique_encounters'
+    :return: dictionary mapping the number of unique encounters to the number of nodes
+    """
+    encounters = np.loadtxt(infile, usecols=(0, 2), dtype=np.int64, ndmin=2)
+    nodes, unique_encounters = encounters[:, 0], encounters[:, 1]
+    keys = np.union1d(nodes, unique_encounters)
+    if len(keys) == 0:
+        return {}
+    counts = np.bincount(unique_encounters, minlength=keys.max() + 1)[keys]
+    return dict(zip(keys.tolist(), counts.tolist()))
 
 
 def write_unique_encounters(outfile, unique_encounters_count):
-    with open(outfile, 'w') as file:
-        for key in sorted(unique_encounters_count.keys()):
-            file.write(str(key) + " " + str(unique_encounters_count[key]) + "\n")
+    counts = np.array(sorted(unique_encounters_count.items()), dtype=np.int64).reshape(-1, 2)
+    np.savetxt(outfile, counts, fmt='%d', delimiter=' ')
 
 
-def generate_unique_encounters_report(config):
+def generate_unique_encounters(encounters_report, unique_encounters_report):
+    write_unique_encounters(unique_encounters_report, read_unique_encounters(encounters_report))
+
+
+def unique_encounters_report_files(config):
     encounters_report = report_file_from_tuple(config, ENCOUNTERS_REPORT)
     unique_encounters_report = report_file_from_tuple(config, UNIQUE_ENCOUNTERS_REPORT)
-    write_unique_encounters(unique_encounters_report, read_unique_encounters(encounters_report))
+    return encounters_report, unique_encounters_report
+
+
+def generate_unique_encounters_report(config):
+    generate_unique_encounters(*unique_encounters_report_files(config))
 
 
 def generate_unique_encounters_reports(config):
-    for c in expand_config(config):
-        generate_unique_encounters_report(c)
+    parallel_starmap(generate_unique_encounters, [unique_encounters_report_files(c) for c in expand_config(config)])
 
 
 def average_unique_encounters(config):
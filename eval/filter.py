@@ -1,18 +1,16 @@
-def filtered_comments_reader(file, comment='#'):
-    for line in file:
-        if line.startswith(comment):
-            continue
-        else:
-            yield line
+import pandas as pd
 
 
-def filtered_split_reader(file, prefixes):
-    for line in filtered_comments_reader(file):
-        yield line.split()
+def read_report(filename, usecols, names):
+    """
+    Reads selected columns of a whitespace-separated report, skipping comments
 
-
-#def filtered_split_reader(file, prefixes):
-#    for line in filtered_comments_reader(file):
-#        fields = line.split()
-#        if fields[1][0] in prefixes:
-#            yield fields
+    :param filename: input file
+    :param usecols: indices of the columns to read
+    :param names: names of the columns to read
+    :return: DataFrame with one row per report line
+    """
+    try:
+        return pd.read_csv(filename, sep=r'\s+', comment='#', header=None, usecols=usecols, names=names)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=names)
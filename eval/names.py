@@ -1,7 +1,8 @@
-import os
+import functools
 import itertools
+import os
 
-from util import create_dir_if_not_exists
+from .util import create_dir_if_not_exists
 
 
 SCENARIO = 'Tacloban'
@@ -70,15 +71,28 @@ def make_title(title_components):
 
 
 def expand_config(config):
-    return itertools.product(*config)
+    # materialized, so that the expansion can be iterated more than once
+    return _expand_config(tuple(tuple(setting) for setting in config))
+
+
+@functools.lru_cache(maxsize=None)
+def _expand_config(config):
+    return tuple(itertools.product(*config))
 
 
-def report_file_from_tuple(tuple, report):
-    report_file = os.path.join(report_dir(), exp_string(tuple), report_file_from(report))
+def report_file_from_tuple(settings, report):
+    # the cache is keyed by the report directory, which changes with exp_dir
+    report_file = _report_file(report_dir(), tuple(settings), report)
+    # not cached, so that a directory deleted in the meantime is created again
     create_dir_if_not_exists(report_file, isfile=True)
     return report_file
 
 
+@functools.lru_cache(maxsize=None)
+def _report_file(report_dir, settings, report):
+    return os.path.join(report_dir, exp_string(settings), report_file_from(report))
+
+
 def report_files_from_config(config, report):
     return [report_file_from_tuple(c, report) for c in expand_config(config)]
 
@@ -93,11 +107,16 @@ def base_config(config):
     return [e[0] for e in config if len(e) == 1]
 
 
-def plot_file_from_tuple(tuple, report, suffix=PLOT_SUFFIX):
-    plot_file = os.path.join(plot_dir(), exp_string(tuple), plot_file_from(report, suffix))
+def plot_file_from_tuple(settings, report, suffix=PLOT_SUFFIX):
+    plot_file = _plot_file(plot_dir(), tuple(settings), report, suffix)
     create_dir_if_not_exists(plot_file, isfile=True)
     return plot_file
 
 
+@functools.lru_cache(maxsize=None)
+def _plot_file(plot_dir, settings, report, suffix):
+    return os.path.join(plot_dir, exp_string(settings), plot_file_from(report, suffix))
+
+
 def plot_files_from_config(config, report, suffix=PLOT_SUFFIX):
     return [plot_file_from_tuple(c, report, suffix) for c in expand_config(config)]
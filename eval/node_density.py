@@ -1,8 +1,9 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
-from names import *
-from average import average_configs
+from .names import *
+from .average import average_configs
+from .util import parallel_starmap
 
 
 def average_node_density(config):
@@ -17,15 +18,12 @@ def plot_node_density(report_file, plot_file, plot_file_scale=None):
     cmap = 'magma'
     fig, ax = plt.subplots(nrows=1, ncols=1, figsize=(3.7, 5))
     dat = np.genfromtxt(report_file, delimiter=' ', skip_header=0)
-    dat.view('f8,f8,f8').sort(order=['f2'], axis=0)
-    x = dat[:, 0]
-    y = dat[:, 1]
+    x = dat[:, 0].astype(int)
+    y = dat[:, 1].astype(int)
     z = dat[:, 2]
-    z.sort()
-    zmedian = np.ma.median(np.ma.masked_equal(z, 0))
-    zlog = np.log10(z / zmedian)
-    zlogmasked = np.ma.masked_invalid(zlog)
-    zlog = zlog + abs(zlogmasked.min()) + 1
+    # rasterize the grid cells into a single image instead of drawing one marker per cell
+    grid = np.zeros((x.max() + 1, y.max() + 1))
+    grid[x, y] = z
     ax.set_aspect(1)
     ax.set_facecolor('black')
     ax.set_xlim(0, 500)
@@ -33,11 +31,10 @@ def plot_node_density(report_file, plot_file, plot_file_scale=None):
     ax.set_xticks([])
     ax.set_yticks([])
     vmin = np.ma.masked_invalid(z).min()
-    vmax = z[-3]  # ignore base camp sleeping spots
-    # print movement + ' ' + str(np.ma.masked_invalid(zlog).min()) + '-' + str(zlog.max()) + ' median: ' + str(zmedian) + '\n'
-    cax = ax.scatter(x, y, c=z, s=np.square(zlog),
-                     norm=colors.SymLogNorm(linthresh=0.001, linscale=0.001, vmin=vmin, vmax=vmax),
-                     cmap=plt.get_cmap(cmap))
+    vmax = np.sort(z)[-3]  # ignore base camp sleeping spots
+    cax = ax.imshow(grid.T, origin='upper', extent=(0, grid.shape[0], grid.shape[1], 0), interpolation='nearest',
+                    norm=colors.SymLogNorm(linthresh=0.001, linscale=0.001, vmin=vmin, vmax=vmax),
+                    cmap=plt.get_cmap(cmap))
     if plot_file_scale is None:
         fig.colorbar(cax, ticks=[], label='Relative node density')
     fig.tight_layout()
@@ -60,5 +57,4 @@ def plot_all_node_density(config, plot_prefixes=None):
     report_files = report_files_from_config(config, NODE_DENSITY_REPORT)
     plot_files = plot_files_from_config(plot_prefixes, NODE_DENSITY_REPORT, suffix='png')
     plot_files_scale = plot_files_from_config(plot_prefixes, NODE_DENSITY_REPORT + '-scale')
-    for (report_file, plot_file, plot_file_scale) in zip(report_files, plot_files, plot_files_scale):
-        plot_node_density(report_file, plot_file, plot_file_scale)
+    parallel_starmap(plot_node_density, zip(report_files, plot_files, plot_files_scale))
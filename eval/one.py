@@ -4,17 +4,18 @@ import sys
 import argparse
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from glob import glob
 
-from util import create_dir_if_not_exists
-import names
+from .util import create_dir_if_not_exists
+from . import names
 
 
 def expand_settings(flat_setting, settings):
     if len(settings.keys()) == 0:
         return [flat_setting]
-    key = settings.keys()[0]
+    key = next(iter(settings))
     list_of_flat_settings = []
     for value in settings[key]:
         # add new element to current flat setting
@@ -110,7 +111,7 @@ def create_exp_settings_file(work_dir, settings_base_file, flat_setting):
 def build(one_dir):
     result = subprocess.call([os.path.join(one_dir, "compile.sh")])
     if result:
-        print >> sys.stderr, "Failed to build the ONE, stop"
+        print("Failed to build the ONE, stop", file=sys.stderr)
         return result
 
 
@@ -118,22 +119,22 @@ def main(argv, settings, plot_all):
     args = parse_args(argv)
 
     if args.plot:
-        print "##"
-        print "## ONLY POST-PROCESSING AND PLOTTING"
-        print "##"
+        print("##")
+        print("## ONLY POST-PROCESSING AND PLOTTING")
+        print("##")
         evaluate(work_dir="", plot_all=plot_all)
         return 0
 
     work_dir = create_work_dir(args)
     start_time = datetime.now()
-    print "##"
-    print "## START EXPERIMENT @ " + str(start_time)
-    print "##   Use working directory: " + work_dir
+    print("##")
+    print("## START EXPERIMENT @ " + str(start_time))
+    print("##   Use working directory: " + work_dir)
 
     if args.skipbuild:
-        print "##   Skipping building experiment"
+        print("##   Skipping building experiment")
     else:
-        print "##   Pre-Build experiment"
+        print("##   Pre-Build experiment")
         build(args.onedir)
 
     #
@@ -144,11 +145,11 @@ def main(argv, settings, plot_all):
     with open(os.path.join(work_dir, "rev.git"), "w+") as fout:
         result = subprocess.call(["git", "rev-parse", "HEAD"], stdout=fout)
         if result:
-            print "Failed to get git revision"
+            print("Failed to get git revision")
     with open(os.path.join(work_dir, "diff.git"), "w+") as fout:
         result = subprocess.call(["git", "diff"], stdout=fout)
         if result:
-            print "Failed to get git diff"
+            print("Failed to get git diff")
 
     # Copy asset files
     settings_base_file = args.config
@@ -162,26 +163,22 @@ def main(argv, settings, plot_all):
         settings_files.append(exp_settings_file)
 
     total = len(settings_files)
-    print "##   Start " + repr(total) + " experiments on " + repr(multiprocessing.cpu_count()) + " core(s)"
-    print "##"
-    pool = multiprocessing.Pool(None)  # use 'multiprocessing.cpu_count()' cores
-
-    def log_result(_):
-        completed = sum(1 for r in results if r.ready())
-        print "[" + str(round(completed * 100.0 / total, 1)) + "%] " + str(completed) + "/" + str(total) + " completed"
-        sys.stdout.flush()
-
+    print("##   Start " + repr(total) + " experiments on " + repr(multiprocessing.cpu_count()) + " core(s)")
+    print("##")
     all_jobs = [construct_call(file, args.onedir) for file in settings_files]
-    results = [pool.apply_async(subprocess.call, (job,), callback=log_result) for job in all_jobs]
-    pool.close()
-    # pool.join() cannot be interrupted by Ctrl+C, so we wait for results manually
-    # See: http://stackoverflow.com/questions/1408356/keyboard-interrupts-with-pythons-multiprocessing-pool/1408476#1408476
-    for r in results:
-        r.wait(9999999)
-    pool.join()
-    print "##   All experiments completed"
-
-    print "##   Evaluate experiments"
+    with ProcessPoolExecutor(max_workers=None) as executor:  # use 'multiprocessing.cpu_count()' cores
+        futures = [executor.submit(subprocess.call, job) for job in all_jobs]
+        try:
+            for completed, _ in enumerate(as_completed(futures), 1):
+                print("[" + str(round(completed * 100.0 / total, 1)) + "%] " + str(completed) + "/" + str(total) + " completed")
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            # leaving the with-block would wait for all queued jobs, so drop them on Ctrl+C
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    print("##   All experiments completed")
+
+    print("##   Evaluate experiments")
     evaluate(work_dir, plot_all)
 
     # Delete temporary files
@@ -192,9 +189,9 @@ def main(argv, settings, plot_all):
         move_asset("exp.log", work_dir)
 
     end_time = datetime.now()
-    print "##"
-    print "## END EXPERIMENT @ " + str(end_time)
-    print "##   Duration: " + str(end_time - start_time)
-    print "##"
+    print("##")
+    print("## END EXPERIMENT @ " + str(end_time))
+    print("##   Duration: " + str(end_time - start_time))
+    print("##")
 
     return 0
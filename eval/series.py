@@ -1,25 +1,49 @@
-import collections
+import io
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
-from names import *
-from average import average_configs
-from filter import filtered_split_reader
+from .names import *
+from .average import average_configs
+from .filter import read_report
+from .util import flush_staged, parallel_starmap
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+DELIVERY_TIME_RES = 60  # sampling interval of the delivery over time reports in seconds
+
+_xy_figure = None
+
+
+def xy_figure():
+    """
+    Returns the figure shared by all x-y plots, created on first use and cleared before each plot
+
+    :return: empty figure
+    """
+    global _xy_figure
+    if _xy_figure is None:
+        _xy_figure = plt.figure()
+    _xy_figure.clf()
+    return _xy_figure
 
 
 def plot_xy(infiles, outfile, titles=None, xscale=1, xticks=24, yscale=1, xlabel=None, ylabel=None, grid=True, mark_intervals=None, size_inches=(4.0, 2.8)):
-    fig = plt.figure()
+    fig = xy_figure()
     ax = fig.add_subplot(111)
     for i, infile in enumerate(infiles):
-        dat = np.loadtxt(infile, comments='#')
-        x = dat[:, 0] / xscale
-        y = dat[:, 1] / yscale
+        dat = read_report(infile, usecols=[0, 1], names=['x', 'y'])
+        x = dat['x'].to_numpy(np.float64) / xscale
+        y = dat['y'].to_numpy(np.float64) / yscale
         if titles is None:
             ax.plot(x, y)
         else:
             ax.plot(x, y, label=titles[i])
-    ax.margins(xmargin=0)
+    ax.margins(x=0)
     if xlabel is not None:
         ax.set_xlabel(xlabel)
     if ylabel is not None:
@@ -29,7 +53,9 @@ def plot_xy(infiles, outfile, titles=None, xscale=1, xticks=24, yscale=1, xlabel
         ax.set_xticks(xticks)
     elif xticks is not None:
         # we assume it is a number and treat it as an interval
-        ax.set_xticks(range(0, np.ceil(np.amax(x) + xticks).astype(int), xticks))
+        # the x limits already span all plotted lines
+        _, xmax = ax.get_xlim()
+        ax.set_xticks(range(0, int(np.ceil(xmax + xticks)), xticks))
     if mark_intervals is not None:
         for interval in mark_intervals:
             ax.axvspan(interval[0], interval[1], color='black', fill=False, linewidth=1)
@@ -44,28 +70,66 @@ def plot_xy(infiles, outfile, titles=None, xscale=1, xticks=24, yscale=1, xlabel
         ax.legend(loc='best', ncol=3)
     fig.set_size_inches(size_inches)
     fig.tight_layout()
-    fig.savefig(outfile, bbox_inches='tight', pad_inches=0, dpi=300)
-    fig.clf()
-    plt.clf()
-    plt.close()
+    # x-y plots are written as vector graphics (PLOT_SUFFIX), which need no rasterization resolution
+    fig.savefig(outfile, bbox_inches='tight', pad_inches=0)
 
 
-def generate_delivery_over_time_report(tuple):
+def generate_delivery_over_time(created_file, delivered_file, outfile):
+    generate_running_delivery_ttl(created_file, delivered_file, outfile, fixedres=DELIVERY_TIME_RES)
+
+
+def delivery_over_time_report_files(tuple):
     created_file = report_file_from_tuple(tuple, CREATED_REPORT)
     delivered_file = report_file_from_tuple(tuple, DELIVERED_REPORT)
     outfile = report_file_from_tuple(tuple, DELIVERY_TIME_REPORT)
-    generate_running_delivery_ttl(created_file, delivered_file, outfile, prefixes=[['M']], fixedres=60)
+    return created_file, delivered_file, outfile
+
+
+def generate_delivery_over_time_report(tuple):
+    generate_delivery_over_time(*delivery_over_time_report_files(tuple))
 
 
 def generate_delivery_over_time_reports(config):
-    for tuple in expand_config(config):
-        generate_delivery_over_time_report(tuple)
+    parallel_starmap(generate_delivery_over_time, [delivery_over_time_report_files(t) for t in expand_config(config)])
 
 
 def average_delivery_over_time(config):
     average_configs(config, DELIVERY_TIME_REPORT)
 
 
+def generate_averaged_delivery_over_time(created_files, delivered_files, outfile):
+    """
+    Averages the delivery over time of several runs without writing a report per run
+
+    Samples are averaged over the runs that contain them, as in average_vals.
+
+    :param created_files: created messages reports of all runs
+    :param delivered_files: delivered messages reports of all runs
+    :param outfile: output file containing the averaged delivery over time
+    """
+    samples = [sample_running_delivery_ttl(*read_running_delivery_ttl_input(c, d), DELIVERY_TIME_RES)
+               for c, d in zip(created_files, delivered_files)]
+    # pad shorter runs with NaN, so that each sample is only averaged over the runs containing it
+    values = np.full((len(samples), max(len(t) for t, _ in samples), 2), np.nan)
+    for i, (t, v) in enumerate(samples):
+        values[i, :len(t), 0] = t
+        values[i, :len(t), 1] = v
+    average = np.nanmean(values, axis=0)
+    write_xy(outfile, average[:, 0], average[:, 1])
+
+
+def averaged_delivery_over_time_files(config):
+    tuples = expand_config(config)
+    created_files = [report_file_from_tuple(t, CREATED_REPORT) for t in tuples]
+    delivered_files = [report_file_from_tuple(t, DELIVERED_REPORT) for t in tuples]
+    outfile = report_file_from_tuple(base_config(config), DELIVERY_TIME_REPORT)
+    return created_files, delivered_files, outfile
+
+
+def generate_averaged_delivery_over_time_reports(configs):
+    parallel_starmap(generate_averaged_delivery_over_time, [averaged_delivery_over_time_files(c) for c in configs])
+
+
 def plot_delivery_over_time(config, plot_prefix=None, titles=None):
     if titles is None:
         titles = config
@@ -82,115 +146,188 @@ def plot_delivery_over_time(config, plot_prefix=None, titles=None):
             ylabel='Delivery Probability')
 
 
-def generate_running_delivery(created_filename, delivered_filename, outfile_name, prefixes, fixedres=None):
-    with open(created_filename, 'r') as created_file, \
-            open(delivered_filename, 'r') as infile, \
-            open(outfile_name, 'w') as outfile:
-        created = 0
-        created_iter = iter(filtered_split_reader(created_file, prefixes))
-        try:
-            created_last_timestamp = float(created_iter.next()[0])
-        except StopIteration:
-            created_last_timestamp = float('inf')
-        delivered = 0
-        delivered_iter = iter(filtered_split_reader(infile, prefixes))
-        try:
-            delivered_last_timestamp = float(delivered_iter.next()[0])
-        except StopIteration:
-            delivered_last_timestamp = float('inf')
-        last_write = float(0)
-        while created_last_timestamp != float('inf') or delivered_last_timestamp != float('inf'):
-            current_time = min(created_last_timestamp, delivered_last_timestamp)
-            if delivered_last_timestamp >= created_last_timestamp:
-                created += 1
-                try:
-                    created_last_timestamp = float(created_iter.next()[0])
-                except StopIteration:
-                    created_last_timestamp = float('inf')
-            else:
-                delivered += 1
-                try:
-                    delivered_last_timestamp = float(delivered_iter.next()[0])
-                except StopIteration:
-                    delivered_last_timestamp = float('inf')
-            delivery = float(delivered) / created
-            if fixedres is None:
-                outfile.write(str(current_time) + ' ' + str(delivery) + '\n')
-            else:
-                while last_write + fixedres < current_time:
-                    last_write += fixedres
-                    outfile.write(str(last_write) + ' ' + str(delivery) + '\n')
-
-
-def generate_running_delivery_ttl(created_filename, delivered_filename, outfile_name, prefixes, fixedres=None):
-    with open(created_filename, 'r') as created_file, \
-            open(delivered_filename, 'r') as infile, \
-            open(outfile_name, 'w') as outfile:
-        created = 0
-        created_list = collections.deque()
-        created_iter = iter(filtered_split_reader(created_file, prefixes))
-        try:
-            next_created = created_iter.next()
-            created_last_timestamp = float(next_created[0])
-            created_last_ttl = float(next_created[5]) * 60
-            created_last_id = next_created[1]
-            created_list.append((created_last_timestamp + created_last_ttl, created_last_id))
-        except StopIteration:
-            created_last_timestamp = float('inf')
-        delivered = 0
-        delivered_ids = set()
-        delivered_iter = iter(filtered_split_reader(infile, prefixes))
-        try:
-            next_delivered = delivered_iter.next()
-            delivered_last_timestamp = float(next_delivered[0])
-            delivered_last_id = next_delivered[1]
-            delivered_ids.add(delivered_last_id)
-        except StopIteration:
-            delivered_last_timestamp = float('inf')
-        last_write = 0
-        while created_last_timestamp != float('inf') or delivered_last_timestamp != float('inf'):
-            current_time = min(created_last_timestamp, delivered_last_timestamp)
-            if delivered_last_timestamp >= created_last_timestamp:
-                created += 1
-                try:
-                    next_created = created_iter.next()
-                    created_last_timestamp = float(next_created[0])
-                    created_last_ttl = float(next_created[5]) * 60  # TTL is in min
-                    created_last_id = next_created[1]
-                    created_list.append((created_last_timestamp + created_last_ttl, created_last_id))
-                except StopIteration:
-                    created_last_timestamp = float('inf')
-            else:
-                delivered += 1
-                try:
-                    next_delivered = delivered_iter.next()
-                    delivered_last_timestamp = float(next_delivered[0])
-                    delivered_last_id = next_delivered[1]
-                    delivered_ids.add(delivered_last_id)
-                except StopIteration:
-                    delivered_last_timestamp = float('inf')
-
-            if fixedres is None:
-                while len(created_list) > 0 and created_list[0][0] < current_time:
-                    (expired, id) = created_list.popleft()
-                    created -= 1
-                    if id in delivered_ids:
-                        delivered -= 1
-                try:
-                    delivery = float(delivered) / created
-                except ZeroDivisionError:
-                    delivery = 0
-                outfile.write(str(current_time) + ' ' + str(delivery) + '\n')
-            else:
-                while last_write + fixedres < current_time:
-                    last_write += fixedres
-                    while len(created_list) > 0 and created_list[0][0] < last_write:
-                        (expired, id) = created_list.popleft()
-                        created -= 1
-                        if id in delivered_ids:
-                            delivered -= 1
-                    try:
-                        delivery = float(delivered) / created
-                    except ZeroDivisionError:
-                        delivery = 0
-                    outfile.write(str(last_write) + ' ' + str(delivery) + '\n')
+def write_xy(outfile_name, x, y):
+    buf = io.StringIO()
+    with open(outfile_name, 'w') as outfile:
+        for xv, yv in zip(x.tolist(), y.tolist()):
+            buf.write(f'{xv!r} {yv!r}\n')
+            flush_staged(buf, outfile)
+        flush_staged(buf, outfile, 0)
+
+
+def merge_events(created_ts, delivered_ts):
+    """
+    Merges message creations and deliveries in time order, a creation goes first on equal timestamps
+
+    :param created_ts: creation times
+    :param delivered_ts: delivery times
+    :return: event times, number of created and number of delivered messages after each event
+    """
+    ts = np.concatenate([created_ts, delivered_ts])
+    is_created = np.concatenate([np.ones(len(created_ts), dtype=np.int64), np.zeros(len(delivered_ts), dtype=np.int64)])
+    order = np.argsort(ts, kind='mergesort')
+    ts = ts[order]
+    created = np.cumsum(is_created[order])
+    delivered = np.arange(1, len(ts) + 1) - created
+    return ts, created, delivered
+
+
+def sample_times(ts, fixedres):
+    """
+    Sample times at multiples of fixedres before the last event
+
+    :param ts: sorted event times
+    :param fixedres: sampling interval
+    :return: sample times and, for each sample, the index of the first event past it, whose counts it takes
+    """
+    end = ts[-1] if len(ts) > 0 else 0
+    grid = np.arange(1, int(np.ceil(end / fixedres))) * fixedres
+    grid = grid[grid < end]
+    return grid, np.searchsorted(ts, grid, side='right')
+
+
+def generate_running_delivery(created_filename, delivered_filename, outfile_name, fixedres=None):
+    created_ts = read_report(created_filename, usecols=[0], names=['time'])['time'].to_numpy(np.float64)
+    delivered_ts = read_report(delivered_filename, usecols=[0], names=['time'])['time'].to_numpy(np.float64)
+    ts, created, delivered = merge_events(created_ts, delivered_ts)
+    delivery = delivered / np.maximum(created, 1)
+    if fixedres is None:
+        write_xy(outfile_name, ts, delivery)
+    else:
+        grid, event = sample_times(ts, fixedres)
+        write_xy(outfile_name, grid, delivery[event])
+
+
+def message_numbers(ids):
+    """
+    Parses message ids of the form M<number>, e.g., M42, into integers
+
+    :param ids: Series of message ids
+    :return: array of message numbers, or None if some id is not of this form
+    """
+    if not pd.api.types.is_string_dtype(ids):
+        return None
+    numbers = ids.str[1:]
+    if not (ids.str.startswith('M').all() and numbers.str.isdecimal().all()):
+        return None
+    return numbers.astype(np.int64).to_numpy()
+
+
+def read_running_delivery_ttl_input(created_filename, delivered_filename):
+    """
+    Reads the columns of the created and delivered reports needed to compute the running delivery ratio
+
+    :param created_filename: created messages report
+    :param delivered_filename: delivered messages report
+    :return: creation times, sorted expiry times and integer-encoded ids of created messages in expiry order,
+             delivery times, integer-encoded ids of delivered messages, number of distinct created ids
+    """
+    created = read_report(created_filename, usecols=[0, 1, 5], names=['time', 'id', 'ttl'])
+    delivered = read_report(delivered_filename, usecols=[0, 1], names=['time', 'id'])
+    # ids index into the bitmap of delivered messages, deliveries of messages not in the created report map to -1
+    created_ids = message_numbers(created['id'])
+    delivered_ids = message_numbers(delivered['id'])
+    n_ids = created_ids.max(initial=-1) + 1 if created_ids is not None else 0
+    if delivered_ids is not None and 0 < n_ids <= 2 * len(created):
+        # the message numbers of the simulator are dense, use them directly instead of hashing the id strings
+        delivered_ids = np.where(delivered_ids < n_ids, delivered_ids, -1)
+    else:
+        created_ids, uniques = pd.factorize(created['id'])
+        delivered_ids = pd.Index(uniques).get_indexer(delivered['id'])
+        n_ids = len(uniques)
+    created_ts = created['time'].to_numpy(np.float64)
+    created_expiry = created_ts + created['ttl'].to_numpy(np.float64) * 60  # TTL is in min
+    # messages expire in order of their expiry time, which differs from creation order if TTLs vary
+    expiry_order = np.argsort(created_expiry, kind='stable')
+    return created_ts, created_expiry[expiry_order], created_ids[expiry_order].astype(np.int32), \
+        delivered['time'].to_numpy(np.float64), delivered_ids.astype(np.int32), n_ids
+
+
+def _run_ttl(created_ts, expiry_ts, expiry_ids, delivered_ts, delivered_ids, delivered_map, out_t, out_v):
+    """
+    Merges created and delivered messages in time order and computes the delivery ratio of unexpired messages after each event
+
+    :param expiry_ts: sorted expiry times of the created messages
+    :param expiry_ids: ids of the created messages in order of expiry_ts
+    :param delivered_map: zeroed bitmap over the created ids, marks the ids of delivered messages
+    :param out_t: output array of event times
+    :param out_v: output array of delivery ratios
+    :return: number of values written to the output arrays
+    """
+    n_created = created_ts.shape[0]
+    n_delivered = delivered_ts.shape[0]
+    created = 0
+    delivered = 0
+    # deliveries are marked as soon as they are read, i.e., one ahead
+    # created messages are expired from the head of the expiry-sorted arrays
+    head = 0
+    if n_delivered > 0 and delivered_ids[0] >= 0:
+        delivered_map[delivered_ids[0]] = 1
+    c = 0
+    d = 0
+    n = 0
+    while c < n_created or d < n_delivered:
+        created_last_timestamp = created_ts[c] if c < n_created else np.inf
+        delivered_last_timestamp = delivered_ts[d] if d < n_delivered else np.inf
+        if delivered_last_timestamp >= created_last_timestamp:
+            current_time = created_last_timestamp
+            created += 1
+            c += 1
+        else:
+            current_time = delivered_last_timestamp
+            delivered += 1
+            d += 1
+            if d < n_delivered and delivered_ids[d] >= 0:
+                delivered_map[delivered_ids[d]] = 1
+        while head < n_created and expiry_ts[head] < current_time:
+            created -= 1
+            if delivered_map[expiry_ids[head]]:
+                delivered -= 1
+            head += 1
+        out_t[n] = current_time
+        out_v[n] = delivered / created if created != 0 else 0.0
+        n += 1
+    return n
+
+
+if njit is not None:
+    _run_ttl = njit(cache=True)(_run_ttl)
+
+
+def sample_running_delivery_ttl(created_ts, expiry_ts, expiry_ids, delivered_ts, delivered_ids, n_ids, fixedres):
+    """
+    Samples the delivery ratio of unexpired messages at multiples of fixedres
+
+    Same result as running the merge and expiring messages at every sample, computed from cumulative counts instead.
+
+    :return: sample times and delivery ratios
+    """
+    ts, created, delivered = merge_events(created_ts, delivered_ts)
+    grid, event = sample_times(ts, fixedres)
+    # a message is expired at the first sample past its expiry time, if any
+    expired_at = np.searchsorted(grid, expiry_ts, side='right')
+    expired = expired_at < len(grid)
+    # its delivery is discounted if it has been read by then, i.e., at most one delivery ahead of those counted
+    first_delivery = np.full(n_ids, np.iinfo(np.int64).max, dtype=np.int64)
+    known = delivered_ids >= 0
+    np.minimum.at(first_delivery, delivered_ids[known], np.flatnonzero(known))
+    expired_delivered = expired.copy()
+    expired_delivered[expired] = first_delivery[expiry_ids[expired]] <= delivered[event[expired_at[expired]]]
+    created = created[event] - np.cumsum(np.bincount(expired_at[expired], minlength=len(grid)))
+    delivered = delivered[event] - np.cumsum(np.bincount(expired_at[expired_delivered], minlength=len(grid)))
+    return grid, np.divide(delivered, created, out=np.zeros(len(grid)), where=created != 0)
+
+
+def generate_running_delivery_ttl(created_filename, delivered_filename, outfile_name, fixedres=None):
+    created_ts, expiry_ts, expiry_ids, delivered_ts, delivered_ids, n_ids = \
+        read_running_delivery_ttl_input(created_filename, delivered_filename)
+    if fixedres is None:
+        n_out = len(created_ts) + len(delivered_ts)
+        out_t = np.empty(n_out, dtype=np.float64)
+        out_v = np.empty(n_out, dtype=np.float64)
+        n = _run_ttl(created_ts, expiry_ts, expiry_ids, delivered_ts, delivered_ids,
+                     np.zeros(n_ids, dtype=np.uint8), out_t, out_v)
+        write_xy(outfile_name, out_t[:n], out_v[:n])
+    else:
+        write_xy(outfile_name, *sample_running_delivery_ttl(created_ts, expiry_ts, expiry_ids, delivered_ts,
+                                                            delivered_ids, n_ids, fixedres))
@@ -1,4 +1,8 @@
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+WRITE_CHUNK_SIZE = 64 * 1024
 
 
 def create_dir_if_not_exists(path, isfile):
@@ -6,5 +10,46 @@ def create_dir_if_not_exists(path, isfile):
         dir = os.path.dirname(path)
     else:
         dir = path
-    if not os.path.exists(dir):
-        os.makedirs(dir)
\ No newline at end of file
+    # exist_ok, so that parallel workers creating the same directory do not race between a check and makedirs
+    os.makedirs(dir, exist_ok=True)
+
+
+def flush_staged(buf, outfile, chunk_size=WRITE_CHUNK_SIZE):
+    """
+    Writes text staged in a StringIO to the output file once at least chunk_size characters have accumulated
+
+    :param buf: io.StringIO staging buffer, emptied after writing
+    :param outfile: output file
+    :param chunk_size: minimum number of staged characters to write, 0 writes whatever is staged
+    """
+    if buf.tell() >= chunk_size:
+        outfile.write(buf.getvalue())
+        buf.seek(0)
+        buf.truncate()
+
+
+def process_count():
+    """
+    Number of worker processes, defaults to the number of cores and can be overridden by setting ND_JOBS
+
+    :return: number of worker processes
+    """
+    return int(os.environ.get('ND_JOBS', multiprocessing.cpu_count()))
+
+
+def parallel_starmap(function, args):
+    """
+    Calls function for each argument tuple in a pool of worker processes, using at most one worker per call
+
+    File names should be resolved before, since workers do not necessarily inherit the current experiment directory.
+
+    :param function: top-level (picklable) function
+    :param args: iterable of argument tuples
+    :return: list of results in the order of args
+    """
+    args = list(args)
+    processes = min(process_count(), len(args))
+    if processes <= 1:
+        return [function(*a) for a in args]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(function, *zip(*args)))
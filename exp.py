@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 # Evaluation script for paper
 #   Milan Schmittner, Max Maass, Tom Schons, and Matthias Hollick,
@@ -37,53 +37,47 @@ settings = {
 
 
 def plot_all():
-    print "Average delivery over time"
-    generate_delivery_over_time_reports((movements, routers, runs))
-    for movement in movements:
-        for router in routers:
-            average_delivery_over_time(([movement], [router], runs))
-    print "Plot delivery over time"
+    # the configurations of each stage are independent and processed in parallel
+    per_movement_router = [([movement], [router], runs) for movement in movements for router in routers]
+    per_movement = [([movement], [routers[0]], runs) for movement in movements]  # for reports independent of router
+
+    print("Average delivery over time")
+    generate_averaged_delivery_over_time_reports(per_movement_router)
+    print("Plot delivery over time")
     plot_delivery_over_time((movements, routers), plot_prefix=[""], titles=(movements,))
 
-    print "Combine delays"
+    print("Combine delays")
     for movement in movements:
         for router in routers:
             combine_delays(([movement], [router], runs))
-    print "Plot delay CDF"
+    print("Plot delay CDF")
     plot_delay_cdf((movements, routers), plot_prefix=[""], titles=(movements,))
 
-    print "Average buffer occupancy"
-    for movement in movements:
-        for router in routers:
-            average_buffer_occupancy(([movement], [router], runs))
-    print "Plot buffer occupancy"
+    print("Average buffer occupancy")
+    average_all_configs(per_movement_router, BUFFER_REPORT)
+    print("Plot buffer occupancy")
     plot_buffer_occupancy((movements, routers), plot_prefix=[""],  titles=(movements,))
 
-    print "Average delivery matrix"
+    print("Average delivery matrix")
     generate_delivery_matrix_reports((movements, routers, runs))
-    for movement in movements:
-        for router in routers:
-            average_delivery_matrix(([movement], [router], runs))
-    print "Plot delivery matrix"
+    average_all_configs(per_movement_router, DELIVERY_MATRIX_REPORT)
+    print("Plot delivery matrix")
     plot_all_delivery_matrix((movements, routers))
 
-    print "Average unique encounters"
+    print("Average unique encounters")
     generate_unique_encounters_reports((movements, [routers[0]], runs))  # report is independent of router
-    for movement in movements:
-        average_unique_encounters(([movement], [routers[0]], runs))  # report is independent of router
-    print "Plot unique encounters"
+    average_all_configs(per_movement, UNIQUE_ENCOUNTERS_REPORT)
+    print("Plot unique encounters")
     plot_unique_encounters((movements, [routers[0]]), plot_prefix=[""], titles=(movements,))
 
-    print "Average total encounters"
-    for movement in movements:
-        average_encounters(([movement], [routers[0]], runs))  # report is independent of router
-    print "Plot total encounters"
+    print("Average total encounters")
+    average_all_configs(per_movement, ENCOUNTERS_REPORT)
+    print("Plot total encounters")
     plot_encounters((movements, [routers[0]]), plot_prefix=[""], titles=(movements,))
 
-    print "Average node density"
-    for movement in movements:
-        average_node_density(([movement], [routers[0]], runs))  # only once per movement model
-    print "Plot node density"
+    print("Average node density")
+    average_all_configs(per_movement, NODE_DENSITY_REPORT)  # only once per movement model
+    print("Plot node density")
     plot_all_node_density((movements, [routers[0]]), plot_prefixes=(movements,))
 
 